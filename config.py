@@ -1,41 +1,108 @@
 import argparse
+import logging
+import os
 import shutil
 import time
+from pathlib import Path
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Log output goes to stderr: with the stdio transport, stdout carries the MCP protocol itself.
+log = logging.getLogger("enl")
 
 # EndNote database file path
 ENL_FILE_PATH = None
 # EndNote data folder path
 DATA_FOLDER_PATH = None
+# Resolved PDF attachment folder (DATA_FOLDER_PATH/PDF)
+PDF_ROOT = None
 # Log switch
 ENABLE_LOG = False
 # Use backup switch
 USE_BACKUP = False
+# Build SQL indexes on the backup copy switch (only effective together with USE_BACKUP)
+BUILD_INDEXES = False
+
+# ioctl request number of FICLONE (reflink the whole file) on Linux
+_FICLONE = 0x40049409
+
+def _kernel_copy(src_fd, dst_fd, size):
+    """Copy file contents inside the kernel; return False if neither method is supported."""
+    if fcntl is not None:
+        try:
+            # Copy-on-write reflink: O(1) on btrfs/xfs and other reflink-capable filesystems.
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+            return True
+        except OSError:
+            pass
+    if hasattr(os, 'copy_file_range'):
+        try:
+            copied = 0
+            while copied < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return True
+        except OSError:
+            pass
+    return False
+
+def fast_copy(src, dst):
+    """
+    Copy src to dst like shutil.copy2, but without bouncing the data through userspace when
+    the platform allows it (reflink, then copy_file_range), falling back to shutil.copy2.
+    """
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            copied = _kernel_copy(fsrc.fileno(), fdst.fileno(), os.fstat(fsrc.fileno()).st_size)
+    except OSError:
+        copied = False
+    if not copied:
+        shutil.copy2(src, dst)
+        return
+    shutil.copystat(src, dst)
+
+def _setup_logging(enable_log):
+    """Send the "enl" logger to stderr, at DEBUG level when logging is enabled."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.handlers[:] = [handler]
+    log.propagate = False
+    log.setLevel(logging.DEBUG if enable_log else logging.WARNING)
 
 def parse_args():
-    global ENL_FILE_PATH, DATA_FOLDER_PATH, ENABLE_LOG, USE_BACKUP
+    global ENL_FILE_PATH, DATA_FOLDER_PATH, PDF_ROOT, ENABLE_LOG, USE_BACKUP, BUILD_INDEXES
     parser = argparse.ArgumentParser(description="EndNote MCP Service configuration")
     parser.add_argument('--enl-file', '-e', required=True, help='Path to the EndNote .enl file')
     parser.add_argument('--data-folder', '-d', required=True, help='Path to the EndNote .Data folder')
     parser.add_argument('--enable-log', '-l', action='store_true', help='Enable detailed log output (default: False)')
     parser.add_argument('--use-backup', '-b', action='store_true', help='Use .enl.backup file for all DB operations (default: False)')
+    parser.add_argument('--build-indexes', '-i', action='store_true', help='Create SQL indexes in the .enl.backup file to speed up searches; requires --use-backup (default: False)')
     args = parser.parse_args()
+    if args.build_indexes and not args.use_backup:
+        parser.error("--build-indexes requires --use-backup, so the original .enl file is never modified")
     ENABLE_LOG = args.enable_log
+    _setup_logging(ENABLE_LOG)
     USE_BACKUP = args.use_backup
+    BUILD_INDEXES = args.build_indexes
     if USE_BACKUP:
         ENL_FILE_PATH = args.enl_file + ".backup"
         # Automatically refresh backup on startup
         try:
-            shutil.copy2(args.enl_file, ENL_FILE_PATH)
-            if ENABLE_LOG:
-                print(f"[CONFIG] .enl.backup refreshed at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            fast_copy(args.enl_file, ENL_FILE_PATH)
+            log.debug("[CONFIG] .enl.backup refreshed at %s", time.strftime('%Y-%m-%d %H:%M:%S'))
         except Exception as e:
-            if ENABLE_LOG:
-                print(f"[CONFIG] Failed to refresh .enl.backup: {e}")
+            log.warning("[CONFIG] Failed to refresh .enl.backup: %s", e)
     else:
         ENL_FILE_PATH = args.enl_file
     DATA_FOLDER_PATH = args.data_folder
-    if ENABLE_LOG:
-        print(f"[CONFIG] ENL_FILE_PATH: {ENL_FILE_PATH}")
-        print(f"[CONFIG] DATA_FOLDER_PATH: {DATA_FOLDER_PATH}")
-        print(f"[CONFIG] ENABLE_LOG: {ENABLE_LOG}")
-        print(f"[CONFIG] USE_BACKUP: {USE_BACKUP}")
+    PDF_ROOT = (Path(DATA_FOLDER_PATH) / 'PDF').resolve()
+    log.debug("[CONFIG] ENL_FILE_PATH: %s", ENL_FILE_PATH)
+    log.debug("[CONFIG] DATA_FOLDER_PATH: %s", DATA_FOLDER_PATH)
+    log.debug("[CONFIG] PDF_ROOT: %s", PDF_ROOT)
+    log.debug("[CONFIG] ENABLE_LOG: %s", ENABLE_LOG)
+    log.debug("[CONFIG] USE_BACKUP: %s", USE_BACKUP)
+    log.debug("[CONFIG] BUILD_INDEXES: %s", BUILD_INDEXES)
@@ -8,4 +8,5 @@ class Reference(BaseModel):
     year: Optional[str] = None
     journal: Optional[str] = None # Corresponds to secondary_title
     abstract: Optional[str] = None
+    keywords: Optional[str] = None
     filepath: Optional[str] = None # Relative path from the .Data folder
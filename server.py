@@ -1,188 +1,756 @@
+import atexit
+import bisect
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import mmap
 import os
+import re
 import sqlite3
-from typing import List, Dict, Any
+import stat
+import sys
+import tempfile
+import threading
+from array import array
+from typing import Annotated, List, Dict, Any, Optional, Tuple
+from pydantic import Field
 from pypdf import PdfReader
 from fastmcp import FastMCP
-from models import Reference
+try:
+    # Optional: MuPDF's native text extraction is much faster than pypdf's pure-Python one.
+    import pymupdf
+except ImportError:
+    pymupdf = None
+try:
+    # Optional: SIMD regex scanning of titles when the FTS5 index is unavailable.
+    import hyperscan
+except ImportError:
+    hyperscan = None
+try:
+    # Optional: faster JSON encoding of tool results, notably long non-ASCII PDF texts.
+    import orjson
+except ImportError:
+    orjson = None
 import config
-import shutil
 import time
 
+log = config.log
+
 # 1. Initialize FastMCP server
-mcp = FastMCP("EndNote Library Reader")
+def _orjson_serializer(data: Any) -> str:
+    """Serialize a tool result to JSON text with orjson (FastMCP falls back to its default serializer on error)."""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+
+mcp = FastMCP("EndNote Library Reader", tool_serializer=_orjson_serializer if orjson is not None else None)
+
+# SQL statements are module constants so every call reuses the same text and hits the
+# connection's prepared-statement cache instead of re-parsing.
+# Pages over refs before the join so a reference with several attachments is never split across
+# pages. The page reads only the requested refs columns (see _list_papers_sql()) and file_res is
+# joined outside it; joining the page back to refs would let SQLite scan refs as the outer loop.
+_SQL_LIST = """SELECT {columns}
+FROM (SELECT {ref_columns} FROM refs r WHERE r.id < ? ORDER BY r.id DESC LIMIT ? OFFSET ?) p{join} ORDER BY p.id DESC;"""
+_SQL_LIST_JOIN_FILES = " LEFT JOIN file_res f ON p.id = f.refs_id"
+# Bound as the cursor for the first page, so every page is a plain rowid range that starts at the
+# cursor instead of a scan from the newest reference (SQLite cannot use the rowid for "? IS NULL OR id < ?").
+_LIST_FIRST_CURSOR = 2**63 - 1
+# Fields list_papers can return, mapped to their (fixed, injection-safe) SELECT expressions.
+_LIST_FIELDS = {
+    'id': 'r.id',
+    'title': 'r.title',
+    'author': 'r.author',
+    'year': 'r.year',
+    'journal': 'r.secondary_title AS journal',
+    'abstract': 'r.abstract',
+    'keywords': 'r.keywords',
+    'filepath': 'f.file_path AS filepath',
+}
+# abstract and keywords are the bulkiest columns, so they are only read when asked for.
+_LIST_DEFAULT_FIELDS = ('id', 'title', 'author', 'year', 'journal', 'filepath')
+# Every title LIKE takes a _like_pattern(), so a query is always matched as a literal substring
+# (ASCII case-insensitive) and "%" or "_" in it are not wildcards, the same as the FTS and hyperscan paths.
+# The trigram MATCH narrows refs down to candidate rows; re-checking LIKE on them keeps the results
+# identical to the LIKE-only statements (the index folds non-ASCII case, LIKE does not).
+_SQL_SEARCH_FTS = """SELECT r.id, r.title, r.author, r.year, r.secondary_title, r.abstract, r.keywords, f.file_path AS filepath
+FROM fts.refs_fts JOIN refs r ON r.id = refs_fts.rowid LEFT JOIN file_res f ON r.id = f.refs_id
+WHERE refs_fts MATCH ? AND r.title LIKE ? ESCAPE '\\' ORDER BY r.year DESC LIMIT ?;"""
+# Matches and orders refs first, so the file_res join only runs for the rows actually returned.
+_SQL_SEARCH = """WITH hits AS (
+SELECT id, title, author, year, secondary_title, abstract, keywords FROM refs WHERE title LIKE ? ESCAPE '\\' ORDER BY year DESC LIMIT ?)
+SELECT h.id, h.title, h.author, h.year, h.secondary_title, h.abstract, h.keywords, f.file_path AS filepath
+FROM hits h LEFT JOIN file_res f ON h.id = f.refs_id ORDER BY h.year DESC;"""
+_SQL_READ_FTS = """SELECT r.id, r.title, r.author, r.year, r.secondary_title, r.abstract, r.keywords, f.file_path AS filepath
+FROM fts.refs_fts JOIN refs r ON r.id = refs_fts.rowid LEFT JOIN file_res f ON r.id = f.refs_id
+WHERE refs_fts MATCH ? AND r.title LIKE ? ESCAPE '\\' LIMIT 1;"""
+_SQL_READ = """SELECT r.id, r.title, r.author, r.year, r.secondary_title, r.abstract, r.keywords, f.file_path AS filepath
+FROM refs r LEFT JOIN file_res f ON r.id = f.refs_id WHERE r.title LIKE ? ESCAPE '\\' LIMIT 1;"""
+_SQL_TITLES = """SELECT id, title FROM refs ORDER BY id;"""
+# Same as _SQL_SEARCH, but for the ids (a JSON array) found by the hyperscan title scan. LIKE is
+# re-checked because hyperscan's caseless mode also folds non-ASCII letters, which LIKE does not.
+_SQL_SEARCH_IDS = """WITH hits AS (
+SELECT id, title, author, year, secondary_title, abstract, keywords FROM refs
+WHERE id IN (SELECT value FROM json_each(?)) AND title LIKE ? ESCAPE '\\' ORDER BY year DESC LIMIT ?)
+SELECT h.id, h.title, h.author, h.year, h.secondary_title, h.abstract, h.keywords, f.file_path AS filepath
+FROM hits h LEFT JOIN file_res f ON h.id = f.refs_id ORDER BY h.year DESC;"""
+# Formatted with one "?" placeholder per requested id.
+_SQL_READ_IDS = """SELECT r.id, r.title, r.author, r.year, r.secondary_title, r.abstract, r.keywords, f.file_path AS filepath
+FROM refs r LEFT JOIN file_res f ON r.id = f.refs_id WHERE r.id IN ({placeholders});"""
 
 # 2. Helper functions (database connection, PDF parsing, etc.)
+# The library is opened read-only, so a single connection is shared by all tool calls.
+# _LOCK serializes both its lazy creation and every use of its cursors.
+_CONN = None
+_LOCK = threading.Lock()
+# Number of rows fetched from SQLite per batch when reading query results.
+_CURSOR_ARRAYSIZE = 200
+# Set by build_fts_index() once the FTS5 sidecar index is usable, with the PRAGMA data_version of
+# the shared connection read before the index was checked against the library (None: the index
+# was not checked through the current connection). Any later commit to the library makes it stale.
+_FTS_READY = False
+_FTS_DATA_VERSION = None
+# Libraries comfortably fit in RAM: map up to 1 GiB of the file and keep a 128 MiB page cache,
+# so repeated queries read pages from memory instead of issuing pread() calls.
+_DB_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-131072;",
+    "PRAGMA mmap_size=1073741824;",
+)
+
 def get_db_connection():
-    """Get and return a configured database connection."""
-    if config.ENABLE_LOG:
-        print(f"[DB] Attempting to connect to database: {config.ENL_FILE_PATH}")
+    """Get and return the shared, configured database connection (opened on first use)."""
+    global _CONN, _FTS_DATA_VERSION, _TITLE_DATA_VERSION
+    if _CONN is not None:
+        return _CONN
+    with _LOCK:
+        if _CONN is not None:
+            return _CONN
+        log.debug("[DB] Attempting to connect to database: %s", config.ENL_FILE_PATH)
+        try:
+            conn = sqlite3.connect(f'file:{config.ENL_FILE_PATH}?mode=ro', uri=True, check_same_thread=False, cached_statements=256)
+            for pragma in _DB_PRAGMAS:
+                conn.execute(pragma)
+            # Must come after temp_store, which drops temp objects when changed.
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(refs);")}
+            if 'keywords' not in columns:
+                # Older libraries have no refs.keywords; shadow refs with a view that adds it as NULL
+                # so every statement (and _ref_factory) can rely on the same column list.
+                log.debug("[DB] refs has no keywords column, reading it as NULL")
+                conn.execute("CREATE TEMP VIEW refs AS SELECT *, NULL AS keywords FROM main.refs;")
+            conn.execute("PRAGMA query_only=ON;")
+            conn.row_factory = _ref_factory
+            # data_version values are only comparable within one connection.
+            _FTS_DATA_VERSION = None
+            _TITLE_DATA_VERSION = None
+            _CONN = conn
+            log.debug("[DB] Database connection successful: %s", config.ENL_FILE_PATH)
+            return _CONN
+        except sqlite3.Error as e:
+            log.warning("[DB] Database connection error: %s", e)
+            return None
+
+def close_db_connection():
+    """Close the shared database connection, if any; the next tool call reopens it."""
+    global _CONN
+    with _LOCK:
+        if _CONN is not None:
+            _CONN.close()
+            _CONN = None
+
+atexit.register(close_db_connection)
+
+def _fts_db_path() -> str:
+    """Return the path of the FTS5 sidecar database that sits next to the library file."""
+    return config.ENL_FILE_PATH + ".fts.db"
+
+# A trigram index matches any substring of at least three characters, so (re-checked with LIKE)
+# it returns exactly the rows LIKE '%q%' does; word tokens would miss matches inside words.
+_FTS_DDL = "CREATE VIRTUAL TABLE refs_fts USING fts5(title, content='', tokenize='trigram')"
+# Identifies the titles the index was built from; the digest also catches edited titles.
+_FTS_META_DDL = "CREATE TABLE fts_meta (row_count INTEGER, max_id INTEGER, titles_digest TEXT)"
+_FTS_MIN_QUERY = 3
+
+def _titles_digest(conn: sqlite3.Connection) -> str:
+    """Return a digest of every (id, title) in the attached src library, in id order."""
+    digest = hashlib.blake2b()
+    cursor = conn.cursor()
+    cursor.arraysize = _CURSOR_ARRAYSIZE
+    for ref_id, title in cursor.execute("SELECT id, title FROM src.refs ORDER BY id;"):
+        digest.update(f"{ref_id}\x00{title}\x00".encode('utf-8', 'replace'))
+    return digest.hexdigest()
+
+def build_fts_index() -> bool:
+    """
+    Create the FTS5 trigram sidecar index over refs.title, or rebuild it when the library's titles
+    changed since it was last built (or the index was created with another schema), then attach it
+    to the shared connection.
+    The library itself is only attached read-only; all writes go to the sidecar database.
+    Returns:
+        bool: True if the index is usable, False if title searches must fall back to LIKE.
+    """
+    global _FTS_READY, _FTS_DATA_VERSION
+    _FTS_READY = False
+    _FTS_DATA_VERSION = None
+    shared = get_db_connection()
+    if not shared:
+        return False
+    # Read before the titles are compared, so a commit that races the check still marks the index stale.
+    with _LOCK:
+        version = _data_version(shared)
+    fts_path = _fts_db_path()
+    try:
+        conn = sqlite3.connect(f'file:{fts_path}', uri=True)
+        try:
+            conn.execute("ATTACH DATABASE ? AS src", (f'file:{config.ENL_FILE_PATH}?mode=ro',))
+            schema = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE name IN ('refs_fts', 'fts_meta');"))
+            if schema.get('refs_fts') != _FTS_DDL or schema.get('fts_meta') != _FTS_META_DDL:
+                with conn:
+                    conn.execute("DROP TABLE IF EXISTS refs_fts;")
+                    conn.execute("DROP TABLE IF EXISTS fts_meta;")
+                    conn.execute(_FTS_DDL + ";")
+                    conn.execute(_FTS_META_DDL + ";")
+            stamp = conn.execute("SELECT COUNT(*), MAX(id) FROM src.refs;").fetchone() + (_titles_digest(conn),)
+            if conn.execute("SELECT row_count, max_id, titles_digest FROM fts_meta;").fetchone() != stamp:
+                log.debug("[FTS] Rebuilding title index: %s", fts_path)
+                with conn:
+                    conn.execute("INSERT INTO refs_fts(refs_fts) VALUES('delete-all');")
+                    conn.execute("INSERT INTO refs_fts(rowid, title) SELECT id, title FROM src.refs;")
+                    conn.execute("DELETE FROM fts_meta;")
+                    conn.execute("INSERT INTO fts_meta (row_count, max_id, titles_digest) VALUES (?, ?, ?);", stamp)
+        finally:
+            conn.close()
+        with _LOCK:
+            cursor = shared.cursor()
+            cursor.row_factory = None
+            if 'fts' not in {row[1] for row in cursor.execute("PRAGMA database_list;")}:
+                cursor.execute("ATTACH DATABASE ? AS fts", (f'file:{fts_path}?mode=ro',))
+    except sqlite3.Error as e:
+        log.debug("[FTS] Index unavailable, falling back to LIKE: %s", e)
+        return False
+    _FTS_DATA_VERSION = version
+    _FTS_READY = True
+    log.debug("[FTS] Title index ready: %s", fts_path)
+    return True
+
+# Indexes that let SQLite walk refs in year order instead of sorting search results while testing
+# titles against LIKE from index pages alone (idx_refs_title_year leads with year and covers the
+# search filter), and look up attachments without scanning file_res. Only ever created in the backup copy.
+_SQL_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_refs_title_year ON refs(year DESC, title, id);",
+    "CREATE INDEX IF NOT EXISTS idx_file_res_refs_id ON file_res(refs_id);",
+)
+
+def build_sql_indexes() -> bool:
+    """
+    Create the search indexes in the library file when --build-indexes is set.
+    Only allowed in backup mode, so the original .enl file used by EndNote is never modified.
+    Must run while the shared read-only connection is closed.
+    Returns:
+        bool: True if the indexes exist, False if they were skipped or could not be created.
+    """
+    if not config.BUILD_INDEXES:
+        return False
+    if not config.USE_BACKUP:
+        log.warning("[DB] --build-indexes ignored: it requires --use-backup so the original .enl file is never modified")
+        return False
     try:
-        conn = sqlite3.connect(f'file:{config.ENL_FILE_PATH}?mode=ro', uri=True)
-        conn.row_factory = sqlite3.Row
-        if config.ENABLE_LOG:
-            print(f"[DB] Database connection successful: {config.ENL_FILE_PATH}")
-        return conn
+        conn = sqlite3.connect(config.ENL_FILE_PATH)
+        try:
+            with conn:
+                for statement in _SQL_INDEXES:
+                    conn.execute(statement)
+        finally:
+            conn.close()
     except sqlite3.Error as e:
-        if config.ENABLE_LOG:
-            print(f"[DB] Database connection error: {e}")
+        log.warning("[DB] Failed to create indexes: %s", e)
+        return False
+    log.debug("[DB] Indexes ready: %s", config.ENL_FILE_PATH)
+    return True
+
+def _data_version(conn: sqlite3.Connection) -> int:
+    """
+    Return PRAGMA data_version of the shared connection, which changes whenever another connection
+    (e.g. EndNote) commits to the library, including edits that leave the row count unchanged.
+    Callers must hold _LOCK.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute("PRAGMA data_version;").fetchone()[0]
+
+def _like_pattern(text: str) -> str:
+    """Return a LIKE pattern (for ESCAPE '\\') matching titles that contain text literally."""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+def _fts_title_query(conn: sqlite3.Connection, text: str) -> Optional[str]:
+    """
+    Translate a fuzzy title query into an FTS5 trigram phrase query.
+    Returns None when the FTS index cannot serve the query, i.e. it is not built, the library was
+    changed since it was built (any commit, including edited titles), or the query is shorter than
+    a trigram.
+    Callers must hold _LOCK.
+    """
+    if not _FTS_READY or len(text) < _FTS_MIN_QUERY:
+        return None
+    if _FTS_DATA_VERSION is None or _data_version(conn) != _FTS_DATA_VERSION:
+        log.debug("[FTS] Title index is stale, falling back to LIKE")
         return None
+    escaped = text.replace('"', '""')
+    return f'"{escaped}"'
+
+# When the FTS index is unavailable and hyperscan is installed, all titles are kept in memory as
+# one NUL-separated UTF-8 buffer (_TITLE_BUF) with parallel arrays of reference ids and title start
+# offsets, so a search is a single SIMD scan of the buffer instead of a per-row LIKE in SQLite.
+_TITLE_IDS = array('q')
+_TITLE_OFFSETS = array('Q')
+_TITLE_BUF = b""
+_TITLE_SCAN_READY = False
+# PRAGMA data_version of the shared connection when the titles were loaded (None: not loaded
+# through the current connection). Any later commit to the library makes the buffer stale.
+_TITLE_DATA_VERSION = None
+
+def build_title_scan_index() -> bool:
+    """
+    Load every title into the in-memory hyperscan buffer, if hyperscan is installed and the FTS5
+    index is not usable. Must run after build_fts_index().
+    Returns:
+        bool: True if search_papers can use the hyperscan scan instead of LIKE.
+    """
+    global _TITLE_IDS, _TITLE_OFFSETS, _TITLE_BUF, _TITLE_SCAN_READY, _TITLE_DATA_VERSION
+    _TITLE_SCAN_READY = False
+    _TITLE_DATA_VERSION = None
+    _TITLE_IDS, _TITLE_OFFSETS, _TITLE_BUF = array('q'), array('Q'), b""
+    if hyperscan is None or _FTS_READY:
+        return False
+    conn = get_db_connection()
+    if not conn:
+        return False
+    ids, offsets, parts, pos = array('q'), array('Q'), [], 0
+    try:
+        with _LOCK:
+            # Read before the titles, so a commit that races the load still marks the buffer stale.
+            version = _data_version(conn)
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.arraysize = _CURSOR_ARRAYSIZE
+            for ref_id, title in cursor.execute(_SQL_TITLES):
+                encoded = (title or "").replace("\x00", "").encode('utf-8', 'replace') + b"\x00"
+                ids.append(ref_id)
+                offsets.append(pos)
+                parts.append(encoded)
+                pos += len(encoded)
+    except sqlite3.Error as e:
+        log.debug("[SCAN] Failed to load titles: %s", e)
+        return False
+    _TITLE_IDS, _TITLE_OFFSETS, _TITLE_BUF = ids, offsets, b"".join(parts)
+    _TITLE_DATA_VERSION = version
+    _TITLE_SCAN_READY = True
+    log.debug("[SCAN] Loaded %s titles (%s bytes) for hyperscan", len(ids), len(_TITLE_BUF))
+    return True
 
-def _build_reference_from_row(row: sqlite3.Row) -> Dict[str, Any]:
-    """Convert a database row to a dictionary for serialization."""
-    ref = Reference(
-        id=row['id'],
-        title=row['title'],
-        author=row['author'],
-        year=row['year'],
-        journal=row['secondary_title'],
-        abstract=row['abstract'],
-        filepath=row['filepath']
+@functools.lru_cache(maxsize=64)
+def _compile_title_pattern(text: str):
+    """Compile a fuzzy title query into a case-insensitive literal hyperscan database."""
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[re.escape(text).encode('utf-8')],
+        ids=[0],
+        elements=1,
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8],
     )
-    d = ref.model_dump()
-    # keywords field compatibility
-    d['keywords'] = row['keywords'] if 'keywords' in row.keys() else None
-    return d
+    return db
+
+def _scan_titles(conn: sqlite3.Connection, text: str) -> Optional[List[int]]:
+    """
+    Return the ids of all references whose title contains text (ASCII case-insensitive, like LIKE),
+    or None when the hyperscan scan cannot serve the query and LIKE must be used, including when
+    the library was changed (references added, removed or edited) since the titles were loaded.
+    Callers must hold _LOCK, which also serializes use of the compiled database's scratch space.
+    """
+    if not _TITLE_SCAN_READY or not text or "\x00" in text:
+        return None
+    if _TITLE_DATA_VERSION is None or _data_version(conn) != _TITLE_DATA_VERSION:
+        log.debug("[SCAN] Title buffer is stale, falling back to LIKE")
+        return None
+    hits = set()
+    def on_match(pattern_id, start, end, flags, context):
+        hits.add(bisect.bisect_right(_TITLE_OFFSETS, end - 1) - 1)
+    try:
+        _compile_title_pattern(text).scan(_TITLE_BUF, match_event_handler=on_match)
+    except hyperscan.error as e:
+        log.debug("[SCAN] hyperscan failed, falling back to LIKE: %s", e)
+        return None
+    return [_TITLE_IDS[i] for i in hits]
+
+# Extracted PDF text is cached on disk, keyed by (path, mtime, size), the extraction budget and the
+# backend, so re-reading a paper skips PDF parsing entirely, even across server restarts.
+# The directory is per user and private (0700), so other local users cannot plant cache entries
+# whose text would be returned as a paper's content (on Windows the temp dir is already per user).
+_PDF_CACHE_DIR = os.path.join(tempfile.gettempdir(), f"enl_pdf_cache-{os.getuid()}" if hasattr(os, 'getuid') else "enl_pdf_cache")
+# pymupdf and pypdf lay out (and join) page text differently, so their results are cached separately.
+_PDF_BACKEND = 'mupdf' if pymupdf is not None else 'pypdf'
+
+# Without pymupdf, page extraction is CPU-bound pure Python, so large PDFs are split across
+# worker processes. Small PDFs stay in-process, where they finish before a worker could even be started.
+# max_workers=None lets the stdlib pick one worker per CPU, capped at 61 on Windows (where more raises ValueError).
+_PDF_POOL = concurrent.futures.ProcessPoolExecutor(max_workers=None)
+_PDF_PARALLEL_MIN_PAGES = 8
+_PDF_PAGES_PER_TASK = 4
+
+# Default number of PDF pages extracted per paper, by read_paper and read_papers.
+_PDF_MAX_PAGES = 200
+# read_papers fetches all ids with one "IN (?, ...)" query, so the list must stay well below
+# SQLite's host parameter limit (999 on builds older than 3.32).
+_READ_PAPERS_MAX_IDS = 100
+
+# pypdf seeks around the file a lot while resolving objects; for large PDFs it reads from a
+# memory map instead, so those seeks become page-cache hits rather than many small reads.
+# Below this size the file is read in a few buffered reads anyway and mapping it gains nothing.
+_PDF_MMAP_MIN_SIZE = 10 * 1024 * 1024
+
+@contextlib.contextmanager
+def _open_pdf_reader(full_path: str):
+    """Yield a PdfReader for a PDF file, reading it through a memory map if it is large."""
+    if os.path.getsize(full_path) < _PDF_MMAP_MIN_SIZE:
+        yield PdfReader(full_path)
+        return
+    with open(full_path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield PdfReader(mm)
+
+def _extract_page_range(full_path: str, start: int, stop: int) -> str:
+    """Extract the text of pages [start, stop) of a PDF file (runs in a worker process)."""
+    with _open_pdf_reader(full_path) as reader:
+        return "".join(reader.pages[i].extract_text() or "" for i in range(start, stop))
+
+def _extract_pdf_text(full_path: str, max_pages: int, max_chars: int) -> Tuple[str, bool]:
+    """
+    Extract the text of a PDF file page by page (with pymupdf if installed, else pypdf), stopping
+    once max_pages pages have been read or max_chars characters collected.
+    Returns:
+        Tuple[str, bool]: The text (at most max_chars characters) and whether it was truncated.
+    """
+    parts = []
+    total = 0
+    if pymupdf is not None:
+        with pymupdf.open(full_path) as doc:
+            n = doc.page_count
+            for page in doc:
+                t = page.get_text("text")
+                parts.append(t)
+                total += len(t) + 1
+                if len(parts) >= max_pages or total >= max_chars:
+                    break
+        text = "\n".join(parts)
+        return text[:max_chars], len(parts) < n or len(text) > max_chars
+    with _open_pdf_reader(full_path) as reader:
+        n = len(reader.pages)
+        pages = min(n, max_pages)
+        parallel = pages >= _PDF_PARALLEL_MIN_PAGES
+        if not parallel:
+            for page in reader.pages:
+                t = page.extract_text() or ""
+                parts.append(t)
+                total += len(t)
+                if len(parts) >= max_pages or total >= max_chars:
+                    break
+            pages = len(parts)
+    if parallel:
+        futures = [
+            _PDF_POOL.submit(_extract_page_range, full_path, start, min(start + _PDF_PAGES_PER_TASK, pages))
+            for start in range(0, pages, _PDF_PAGES_PER_TASK)
+        ]
+        for j, future in enumerate(futures):
+            t = future.result()
+            parts.append(t)
+            total += len(t)
+            if total >= max_chars:
+                for pending in futures[j + 1:]:
+                    pending.cancel()
+                pages = min((j + 1) * _PDF_PAGES_PER_TASK, pages)
+                break
+    text = "".join(parts)
+    return text[:max_chars], pages < n or len(text) > max_chars
+
+def _pdf_cache_dir_is_private() -> bool:
+    """
+    Create the PDF text cache directory (mode 0700) if needed, and return whether it can be trusted:
+    a real directory (not a symlink) owned by the current user and not accessible to anyone else.
+    """
+    try:
+        os.makedirs(_PDF_CACHE_DIR, mode=0o700, exist_ok=True)
+        st = os.lstat(_PDF_CACHE_DIR)
+    except OSError as e:
+        log.debug("[TOOL] PDF text cache unavailable: %s", e)
+        return False
+    if not stat.S_ISDIR(st.st_mode) or (hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & 0o077)):
+        log.warning("[TOOL] PDF text cache disabled: %s is not a directory private to the current user", _PDF_CACHE_DIR)
+        return False
+    return True
+
+@functools.lru_cache(maxsize=64)
+def _cached_pdf_text(key: str, full_path: str, max_pages: int, max_chars: int) -> Tuple[str, bool]:
+    """Return (text, truncated) for a cache key, from the disk cache or by extracting and storing it."""
+    if not _pdf_cache_dir_is_private():
+        return _extract_pdf_text(full_path, max_pages, max_chars)
+    cache_file = os.path.join(_PDF_CACHE_DIR, key + ".json")
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+            log.debug("[TOOL] PDF text cache hit: %s", cache_file)
+            return cached["text"], cached["truncated"]
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    text, truncated = _extract_pdf_text(full_path, max_pages, max_chars)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=_PDF_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"text": text, "truncated": truncated}, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except (OSError, UnicodeError) as e:
+        log.debug("[TOOL] Failed to write PDF text cache: %s", e)
+    return text, truncated
+
+def _pdf_text_cache(full_path: str, max_pages: int, max_chars: int) -> Tuple[str, bool]:
+    """
+    Return (text, truncated) for a PDF, cached on disk and in-process.
+    The file is stat()ed on every call so that an edited or replaced PDF gets a new cache key.
+    """
+    st = os.stat(full_path)
+    key = hashlib.blake2b(f"{_PDF_BACKEND}|{full_path}|{st.st_mtime_ns}|{st.st_size}|{max_pages}|{max_chars}".encode()).hexdigest()
+    return _cached_pdf_text(key, full_path, max_pages, max_chars)
+
+def _dict_factory(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    """Row factory that returns each row as a plain dict keyed by column name."""
+    return dict(zip([d[0] for d in cursor.description], row))
+
+def _ref_factory(cursor: sqlite3.Cursor, r: tuple) -> Dict[str, Any]:
+    """
+    Row factory of the shared connection: builds the reference dict straight from a row.
+    Every reference query must select exactly: id, title, author, year, secondary_title, abstract, keywords, filepath.
+    """
+    return {'id': r[0], 'title': r[1], 'author': r[2], 'year': r[3], 'journal': r[4], 'abstract': r[5], 'keywords': r[6], 'filepath': r[7]}
+
+@functools.lru_cache(maxsize=32)
+def _list_papers_sql(fields: Tuple[str, ...]) -> str:
+    """Return the list_papers statement selecting the given (allow-listed) fields; id is always included."""
+    fields = ('id',) + tuple(f for f in fields if f != 'id')
+    ref_columns = ", ".join(_LIST_FIELDS[field] for field in fields if field != 'filepath')
+    columns = ", ".join(_LIST_FIELDS[field] if field == 'filepath' else f"p.{field}" for field in fields)
+    join = _SQL_LIST_JOIN_FILES if 'filepath' in fields else ""
+    return _SQL_LIST.format(columns=columns, ref_columns=ref_columns, join=join)
+
+def _build_paper_from_row(row: Dict[str, Any], max_pages: int, max_chars: int) -> Dict[str, Any]:
+    """
+    Add the PDF text of a reference row with a PDF attachment to it, and return the row.
+    Returns {id, error} instead if the attachment path points outside the PDF folder.
+    """
+    sanitized_path = row['filepath'].replace('internal-pdf://', '').strip()
+    full_path = (config.PDF_ROOT / sanitized_path).resolve()
+    log.debug("[TOOL] PDF path resolved: %s", full_path)
+    if config.PDF_ROOT not in full_path.parents:
+        log.warning("[TOOL] PDF path outside %s blocked: %s", config.PDF_ROOT, full_path)
+        return {"id": row['id'], "error": f"Path traversal blocked for attachment '{row['filepath']}'."}
+    truncated = False
+    try:
+        text, truncated = _pdf_text_cache(str(full_path), max_pages, max_chars)
+    except FileNotFoundError:
+        text = f"Error: File not found at {full_path}."
+        log.debug("[TOOL] PDF file not found: %s", full_path)
+    except Exception as e:
+        text = f"Error parsing PDF: {e}"
+        log.warning("[TOOL] PDF parsing exception: %s", e)
+    row['text'] = text
+    row['truncated'] = truncated
+    return row
 
 # 3. Define MCP tools
-@mcp.tool(description="Return references in the EndNote library with pagination. Use offset (int, default 0) and limit (int, default 10) to fetch a page of results. Returns a list of dicts with fields: id, title, author, year, journal, abstract, keywords, filepath. Typical: list_papers(offset=0, limit=10).")
-def list_papers(offset: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+@mcp.tool(description="Return references in the EndNote library with keyset pagination, newest first. Use limit (int, 1-1000, default 10) for the page size and pass the next_cursor of the previous page as after_id (int) to fetch the next page; omit after_id for the first page. Use fields (list of strings, any of: id, title, author, year, journal, abstract, keywords, filepath; default all except abstract and keywords) to choose the returned fields; id is always included. Returns a dict with fields: references (list of dicts with the requested fields) and next_cursor (int, or null when there are no more pages). The offset parameter is deprecated. To get the full text of several listed papers, pass their ids to read_papers in one call instead of calling read_paper for each. Typical: list_papers(limit=10), then list_papers(after_id=<next_cursor>, limit=10).")
+def list_papers(
+    after_id: Optional[Annotated[int, Field(gt=0)]] = None,
+    limit: Annotated[int, Field(gt=0, le=1000)] = 10,
+    fields: Optional[List[str]] = None,
+    offset: Optional[Annotated[int, Field(ge=0)]] = None,
+) -> Dict[str, Any]:
     """
-    List references in the EndNote library with pagination.
+    List references in the EndNote library with keyset pagination (newest first).
     Args:
-        offset (int): The starting index of the page (default 0, must be >=0).
-        limit (int): The number of results per page (default 10, must be >0).
+        after_id (Optional[int]): Cursor returned as next_cursor by the previous page; only references with a smaller id are returned (default None, i.e. the first page).
+        limit (int): The number of references per page (default 10, must be between 1 and 1000).
+        fields (Optional[List[str]]): Fields to return, any of: id, title, author, year, journal, abstract, keywords, filepath (default None, i.e. all except abstract and keywords). id is always included; unknown names are ignored.
+        offset (Optional[int]): Deprecated. The starting index of the page, only honoured when after_id is not given.
     Returns:
-        List[Dict[str, Any]]: List of references, each with fields: id, title, author, year, journal, abstract, keywords, filepath.
+        Dict[str, Any]: {references, next_cursor}. references is a list of references, each with the requested fields. next_cursor is the id to pass as after_id for the next page, or None when there are no more pages.
     Typical usage:
-        list_papers(offset=0, limit=10)
+        list_papers(limit=10)
+        list_papers(after_id=page['next_cursor'], limit=10)
+        list_papers(limit=10, fields=['title', 'abstract'])
+    To read the full text of several listed papers, prefer one read_papers([...ids]) call over repeated read_paper calls.
     """
-    if config.ENABLE_LOG:
-        print(f"[TOOL] list_papers(offset={offset}, limit={limit}) called")
-    if not isinstance(offset, int) or offset < 0:
+    log.debug("[TOOL] list_papers(after_id=%s, limit=%s, fields=%s, offset=%s) called", after_id, limit, fields, offset)
+    fields = tuple(f for f in fields or () if f in _LIST_FIELDS) or _LIST_DEFAULT_FIELDS
+    if offset is not None:
+        log.warning("[TOOL] list_papers: 'offset' is deprecated, pass the previous page's next_cursor as 'after_id' instead")
+    if offset is None or after_id is not None:
         offset = 0
-    if not isinstance(limit, int) or limit <= 0:
-        limit = 10
     conn = get_db_connection()
     if not conn:
-        return []
+        return {"references": [], "next_cursor": None}
     references = []
     try:
-        cursor = conn.cursor()
-        query = """
-        SELECT r.id, r.title, r.author, r.year, r.secondary_title, r.abstract, r.keywords, f.file_path AS filepath
-        FROM refs r LEFT JOIN file_res f ON r.id = f.refs_id ORDER BY r.id DESC LIMIT ? OFFSET ?;
-        """
-        if config.ENABLE_LOG:
-            print(f"[DB] Executing SQL: {query.strip()} | Params: limit={limit}, offset={offset}")
-        cursor.execute(query, (limit, offset))
-        rows = cursor.fetchall()
-        for row in rows:
-            references.append(_build_reference_from_row(row))
+        with _LOCK:
+            cursor = conn.cursor()
+            cursor.arraysize = _CURSOR_ARRAYSIZE
+            # Projections vary with fields, so build rows by column name instead of _ref_factory.
+            cursor.row_factory = _dict_factory
+            sql_query = _list_papers_sql(fields)
+            log.debug("[DB] Executing SQL: %s | Params: after_id=%s, limit=%s, offset=%s", sql_query, after_id, limit, offset)
+            cursor.execute(sql_query, (after_id if after_id is not None else _LIST_FIRST_CURSOR, limit, offset))
+            references = list(cursor)
     except Exception as e:
-        if config.ENABLE_LOG:
-            print(f"[DB] list_papers exception: {e}")
-    finally:
-        conn.close()
-    return references
+        log.warning("[DB] list_papers exception: %s", e)
+    page_size = len({ref['id'] for ref in references})
+    next_cursor = references[-1]['id'] if page_size == limit else None
+    return {"references": references, "next_cursor": next_cursor}
 
-@mcp.tool(description="Fuzzy search references by title in the EndNote library. Use when the user only knows part of the title or keywords, or wants to find related topics. Parameter: query (string, case-insensitive, supports Chinese/English). Returns a list of dicts with fields: id, title, author, year, journal, abstract, keywords, filepath. Typical: search_papers('distillation').")
-def search_papers(query: str) -> List[Dict[str, Any]]:
+@mcp.tool(description="Fuzzy search references by title in the EndNote library. Use when the user only knows part of the title or keywords, or wants to find related topics. Parameters: query (string, case-insensitive, supports Chinese/English, matched literally as part of the title, so % and _ are not wildcards), limit (int, 1-1000, default 200, maximum number of results). Returns a list of dicts with fields: id, title, author, year, journal, abstract, keywords, filepath. Typical: search_papers('distillation').")
+def search_papers(query: str, limit: Annotated[int, Field(gt=0, le=1000)] = 200) -> List[Dict[str, Any]]:
     """
     Fuzzy search references by title in the EndNote library.
     Args:
-        query (str): Title keyword(s) to search for (case-insensitive, supports Chinese/English, fuzzy match).
+        query (str): Title keyword(s) to search for (case-insensitive, supports Chinese/English, fuzzy match; % and _ match themselves).
+        limit (int): The maximum number of results to return, newest first (default 200, must be between 1 and 1000).
     Returns:
         List[Dict[str, Any]]: List of references, each with fields: id, title, author, year, journal, abstract, keywords, filepath.
     Typical usage:
         search_papers('distillation')
     """
-    if config.ENABLE_LOG:
-        print(f"[TOOL] search_papers(query={query}) called")
+    log.debug("[TOOL] search_papers(query=%s, limit=%s) called", query, limit)
     conn = get_db_connection()
     if not conn:
         return []
     references = []
     try:
-        cursor = conn.cursor()
-        sql_query = """
-        SELECT r.id, r.title, r.author, r.year, r.secondary_title, r.abstract, r.keywords, f.file_path AS filepath
-        FROM refs r LEFT JOIN file_res f ON r.id = f.refs_id WHERE r.title LIKE ? ORDER BY r.year DESC;
-        """
-        if config.ENABLE_LOG:
-            print(f"[DB] Executing SQL: {sql_query.strip()} | Params: query=%{query}%")
-        cursor.execute(sql_query, (f'%{query}%',))
-        rows = cursor.fetchall()
-        for row in rows:
-            references.append(_build_reference_from_row(row))
+        with _LOCK:
+            cursor = conn.cursor()
+            cursor.arraysize = _CURSOR_ARRAYSIZE
+            fts_query = _fts_title_query(conn, query)
+            if fts_query:
+                log.debug("[DB] Executing SQL: %s | Params: query=%s, title=%s, limit=%s", _SQL_SEARCH_FTS, fts_query, _like_pattern(query), limit)
+                cursor.execute(_SQL_SEARCH_FTS, (fts_query, _like_pattern(query), limit))
+                references = cursor.fetchall()
+            else:
+                hit_ids = _scan_titles(conn, query)
+                if hit_ids is not None:
+                    log.debug("[SCAN] %s titles matched: query=%s", len(hit_ids), query)
+                    if hit_ids:
+                        log.debug("[DB] Executing SQL: %s | Params: ids=%s, title=%s, limit=%s", _SQL_SEARCH_IDS, hit_ids, _like_pattern(query), limit)
+                        cursor.execute(_SQL_SEARCH_IDS, (json.dumps(hit_ids), _like_pattern(query), limit))
+                        references = cursor.fetchall()
+                else:
+                    log.debug("[DB] Executing SQL: %s | Params: query=%s, limit=%s", _SQL_SEARCH, _like_pattern(query), limit)
+                    cursor.execute(_SQL_SEARCH, (_like_pattern(query), limit))
+                    references = cursor.fetchall()
     except Exception as e:
-        if config.ENABLE_LOG:
-            print(f"[DB] search_papers exception: {e}")
-    finally:
-        conn.close()
+        log.warning("[DB] search_papers exception: %s", e)
     return references
 
-@mcp.tool(description="Find a paper by (fuzzy) title and return its metadata and PDF full text. Use when the user needs the full content and bibliographic info of a paper. Parameter: title (string, case-insensitive, fuzzy match). Returns a dict with fields: id, title, author, year, journal, abstract, keywords, filepath, text. Typical: read_paper('Knowledge Distillation Review').")
-def read_paper(title: str) -> dict:
+@mcp.tool(description="Find a paper by (fuzzy) title and return its metadata and PDF full text. Use when the user needs the full content and bibliographic info of a paper. Parameters: title (string, case-insensitive, fuzzy match; % and _ are not wildcards), max_chars (int, default 200000) and max_pages (int, default 200) to bound the extracted text. Returns a dict with fields: id, title, author, year, journal, abstract, keywords, filepath, text, truncated (true if the text was cut at max_chars or max_pages; call again with larger limits for more). Typical: read_paper('Knowledge Distillation Review').")
+def read_paper(
+    title: str,
+    max_chars: Annotated[int, Field(gt=0)] = 200_000,
+    max_pages: Annotated[int, Field(gt=0)] = _PDF_MAX_PAGES,
+) -> dict:
     """
     Find a paper by (fuzzy) title and return its metadata and PDF full text.
     Args:
-        title (str): Title keyword(s) to search for (case-insensitive, fuzzy match).
+        title (str): Title keyword(s) to search for (case-insensitive, fuzzy match; % and _ match themselves).
+        max_chars (int): The maximum number of characters of PDF text to return (default 200000, must be >0).
+        max_pages (int): The maximum number of PDF pages to extract (default 200, must be >0).
     Returns:
-        dict: Paper metadata and content, with fields: id, title, author, year, journal, abstract, keywords, filepath, text (PDF full text or error message).
+        dict: Paper metadata and content, with fields: id, title, author, year, journal, abstract, keywords, filepath, text (PDF full text or error message), truncated (whether text stops before the end of the PDF).
     Typical usage:
         read_paper('Knowledge Distillation Review')
     """
-    if config.ENABLE_LOG:
-        print(f"[TOOL] read_paper(title={title}) called")
+    log.debug("[TOOL] read_paper(title=%s, max_chars=%s, max_pages=%s) called", title, max_chars, max_pages)
     conn = get_db_connection()
     if not conn:
         return {"error": "Database connection failed."}
     try:
-        cursor = conn.cursor()
-        sql_query = """
-        SELECT r.id, r.title, r.author, r.year, r.secondary_title, r.abstract, r.keywords, f.file_path AS filepath
-        FROM refs r LEFT JOIN file_res f ON r.id = f.refs_id WHERE r.title LIKE ? LIMIT 1;
-        """
-        if config.ENABLE_LOG:
-            print(f"[DB] Executing SQL: {sql_query.strip()} | Params: title=%{title}%")
-        cursor.execute(sql_query, (f'%{title}%',))
-        row = cursor.fetchone()
+        with _LOCK:
+            cursor = conn.cursor()
+            row = None
+            fts_query = _fts_title_query(conn, title)
+            if fts_query:
+                log.debug("[DB] Executing SQL: %s | Params: query=%s, title=%s", _SQL_READ_FTS, fts_query, _like_pattern(title))
+                cursor.execute(_SQL_READ_FTS, (fts_query, _like_pattern(title)))
+                row = cursor.fetchone()
+            else:
+                log.debug("[DB] Executing SQL: %s | Params: title=%s", _SQL_READ, _like_pattern(title))
+                cursor.execute(_SQL_READ, (_like_pattern(title),))
+                row = cursor.fetchone()
         if not row or not row['filepath']:
-            if config.ENABLE_LOG:
-                print(f"[DB] No matching paper found or no PDF: title={title}")
+            log.debug("[DB] No matching paper found or no PDF: title=%s", title)
             return {"error": f"No paper found with title containing '{title}' or no PDF attached."}
-        sanitized_path = row['filepath'].replace('internal-pdf://', '').strip()
-        full_path = os.path.join(config.DATA_FOLDER_PATH, 'PDF', sanitized_path)
-        if config.ENABLE_LOG:
-            print(f"[TOOL] PDF path resolved: {full_path}")
-        try:
-            reader = PdfReader(full_path)
-            text = "".join(page.extract_text() or "" for page in reader.pages)
-        except FileNotFoundError:
-            text = f"Error: File not found at {full_path}."
-            if config.ENABLE_LOG:
-                print(f"[TOOL] PDF file not found: {full_path}")
-        except Exception as e:
-            text = f"Error parsing PDF: {e}"
-            if config.ENABLE_LOG:
-                print(f"[TOOL] PDF parsing exception: {e}")
-        return {
-            "id": row['id'],
-            "title": row['title'],
-            "author": row['author'],
-            "year": row['year'],
-            "journal": row['secondary_title'],
-            "abstract": row['abstract'],
-            "keywords": row['keywords'] if 'keywords' in row.keys() else None,
-            "filepath": row['filepath'],
-            "text": text
-        }
+        return _build_paper_from_row(row, max_pages, max_chars)
     except Exception as e:
-        if config.ENABLE_LOG:
-            print(f"[DB] read_paper exception: {e}")
+        log.warning("[DB] read_paper exception: %s", e)
         return {"error": f"Exception: {e}"}
-    finally:
-        conn.close()
+
+@mcp.tool(description="Return metadata and PDF full text for several papers at once, by id (e.g. ids taken from list_papers or search_papers results). Prefer this over calling read_paper repeatedly: the papers are fetched with one query and their PDFs are extracted in parallel. Parameters: ids (list of 1-100 ints), max_chars_per_paper (int, default 50000). Returns a list of dicts in the same order as ids, each with fields: id, title, author, year, journal, abstract, keywords, filepath, text, truncated, or id and error if the paper is missing or has no PDF. Typical: read_papers([12, 34, 56]).")
+def read_papers(
+    ids: Annotated[List[int], Field(min_length=1, max_length=_READ_PAPERS_MAX_IDS)],
+    max_chars_per_paper: Annotated[int, Field(gt=0)] = 50_000,
+) -> List[Dict[str, Any]]:
+    """
+    Return metadata and PDF full text for several papers by id.
+    Args:
+        ids (List[int]): Reference ids, e.g. from list_papers or search_papers results (1 to 100 ids).
+        max_chars_per_paper (int): The maximum number of characters of PDF text to return per paper (default 50000, must be >0).
+    Returns:
+        List[Dict[str, Any]]: One dict per id, in input order, with fields: id, title, author, year, journal, abstract, keywords, filepath, text, truncated; or id and error if the paper is missing or has no PDF.
+    Typical usage:
+        read_papers([12, 34, 56])
+    """
+    log.debug("[TOOL] read_papers(ids=%s, max_chars_per_paper=%s) called", ids, max_chars_per_paper)
+    conn = get_db_connection()
+    if not conn:
+        return [{"id": i, "error": "Database connection failed."} for i in ids]
+    unique_ids = list(dict.fromkeys(ids))
+    rows = {}
+    try:
+        with _LOCK:
+            cursor = conn.cursor()
+            cursor.arraysize = _CURSOR_ARRAYSIZE
+            sql_query = _SQL_READ_IDS.format(placeholders=", ".join("?" * len(unique_ids)))
+            log.debug("[DB] Executing SQL: %s | Params: ids=%s", sql_query, unique_ids)
+            cursor.execute(sql_query, unique_ids)
+            for row in cursor:
+                # Like read_paper, use the first PDF attachment of each reference.
+                if row['id'] not in rows or (not rows[row['id']]['filepath'] and row['filepath']):
+                    rows[row['id']] = row
+    except Exception as e:
+        log.warning("[DB] read_papers exception: %s", e)
+        return [{"id": i, "error": f"Exception: {e}"} for i in ids]
+    papers = {}
+    with_pdf = [i for i in unique_ids if i in rows and rows[i]['filepath']]
+    if with_pdf:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(with_pdf))) as pool:
+            futures = {i: pool.submit(_build_paper_from_row, rows[i], _PDF_MAX_PAGES, max_chars_per_paper) for i in with_pdf}
+            papers = {i: future.result() for i, future in futures.items()}
+    results = []
+    for i in ids:
+        if i in papers:
+            results.append(papers[i])
+        else:
+            log.debug("[DB] No matching paper found or no PDF: id=%s", i)
+            results.append({"id": i, "error": f"No paper found with id {i} or no PDF attached."})
+    return results
 
 @mcp.tool(
     name="refresh_backup",
@@ -204,11 +772,15 @@ def refresh_backup() -> dict:
     src = config.ENL_FILE_PATH[:-7]  # remove .backup
     dst = config.ENL_FILE_PATH
     try:
-        shutil.copy2(src, dst)
+        # Release the shared connection before overwriting the file it reads from.
+        close_db_connection()
+        config.fast_copy(src, dst)
+        build_sql_indexes()
+        build_fts_index()
+        build_title_scan_index()
         size = os.path.getsize(dst)
         msg = f".enl.backup refreshed successfully, size {size} bytes."
-        if config.ENABLE_LOG:
-            print(f"[TOOL] refresh_backup: {msg}")
+        log.debug("[TOOL] refresh_backup: %s", msg)
         return {
             "status": "success",
             "message": msg,
@@ -217,8 +789,7 @@ def refresh_backup() -> dict:
         }
     except Exception as e:
         err = f"Failed to refresh .enl.backup: {e}"
-        if config.ENABLE_LOG:
-            print(f"[TOOL] refresh_backup: {err}")
+        log.warning("[TOOL] refresh_backup: %s", err)
         return {
             "status": "error",
             "message": err,
@@ -229,26 +800,31 @@ def refresh_backup() -> dict:
 # 4. Start the server
 if __name__ == "__main__":
     config.parse_args()
+    build_sql_indexes()
+    build_fts_index()
+    build_title_scan_index()
     # Print registered tools with full parameter signatures
     registered_tools = [
-        "list_papers(offset: int = 0, limit: int = 10)",
-        "search_papers(query: str)",
-        "read_paper(title: str)",
+        "list_papers(after_id: Optional[int] = None, limit: int = 10, fields: Optional[List[str]] = None, offset: Optional[int] = None)",
+        "search_papers(query: str, limit: int = 200)",
+        "read_paper(title: str, max_chars: int = 200000, max_pages: int = 200)",
+        "read_papers(ids: List[int], max_chars_per_paper: int = 50000)",
         "refresh_backup()"
     ]
-    if config.ENABLE_LOG:
-        print("[LOG] EndNote MCP Server is starting...")
-        print(f"[LOG] ENL_FILE_PATH: {config.ENL_FILE_PATH}")
-        print(f"[LOG] DATA_FOLDER_PATH: {config.DATA_FOLDER_PATH}")
-        print(f"[LOG] ENABLE_LOG: {config.ENABLE_LOG}")
-        print("[LOG] Registered tools:")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[LOG] EndNote MCP Server is starting...")
+        log.debug("[LOG] ENL_FILE_PATH: %s", config.ENL_FILE_PATH)
+        log.debug("[LOG] DATA_FOLDER_PATH: %s", config.DATA_FOLDER_PATH)
+        log.debug("[LOG] ENABLE_LOG: %s", config.ENABLE_LOG)
+        log.debug("[LOG] Registered tools:")
         for tool in registered_tools:
-            print(f"- {tool}")
-        print("[LOG] Server is ready and waiting for client connections...")
+            log.debug("- %s", tool)
+        log.debug("[LOG] Server is ready and waiting for client connections...")
     else:
-        print("EndNote MCP Server is starting...")
-        print("Registered tools:")
+        # stderr, like the log: with the stdio transport, stdout carries the MCP protocol itself.
+        print("EndNote MCP Server is starting...", file=sys.stderr)
+        print("Registered tools:", file=sys.stderr)
         for tool in registered_tools:
-            print(f"- {tool}")
-        print("\nServer is ready and waiting for client connections...")
+            print(f"- {tool}", file=sys.stderr)
+        print("\nServer is ready and waiting for client connections...", file=sys.stderr)
     mcp.run()
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+import server
+
+search_papers = server.search_papers.fn
+
+TITLES = {
+    1: ("Convolutional nets in practice", "2019"),
+    2: ("Graph network analysis", "2020"),
+    3: ("Calling C++ from Python", "2017"),
+    4: ("Deep network compression", "2021"),
+    5: ("The R package survival", "2018"),
+    6: ("Tuning 100% of k_means", "2016"),
+}
+
+
+class SearchPapersTest(unittest.TestCase):
+    """search_papers must return exactly the rows a plain title LIKE '%query%' returns."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.enl = os.path.join(self.tmp.name, "lib.enl")
+        conn = sqlite3.connect(self.enl)
+        conn.execute("CREATE TABLE refs (id INTEGER PRIMARY KEY, title TEXT, author TEXT, year TEXT, secondary_title TEXT, abstract TEXT, keywords TEXT);")
+        conn.execute("CREATE TABLE file_res (refs_id INTEGER, file_path TEXT);")
+        conn.executemany(
+            "INSERT INTO refs (id, title, year) VALUES (?, ?, ?);",
+            [(i, title, year) for i, (title, year) in TITLES.items()],
+        )
+        conn.commit()
+        conn.close()
+        config.ENL_FILE_PATH = self.enl
+        config.DATA_FOLDER_PATH = self.tmp.name
+        config.PDF_ROOT = (Path(self.tmp.name) / 'PDF').resolve()
+        server.close_db_connection()
+        self.build_indexes()
+
+    def build_indexes(self):
+        self.assertTrue(server.build_fts_index())
+
+    def tearDown(self):
+        server.close_db_connection()
+        self.tmp.cleanup()
+
+    def edit_library(self, sql, params=()):
+        """Change the library through another connection, the way EndNote does."""
+        conn = sqlite3.connect(self.enl)
+        with conn:
+            conn.execute(sql, params)
+        conn.close()
+
+    def ids(self, query):
+        return sorted(ref['id'] for ref in search_papers(query))
+
+    def test_punctuation_is_not_dropped(self):
+        self.assertEqual(self.ids('C++'), [3])
+
+    def test_matches_inside_words(self):
+        self.assertEqual(self.ids('c'), [1, 3, 4, 5])
+        self.assertEqual(self.ids('ack'), [5])
+        self.assertEqual(self.ids('etwork'), [2, 4])
+
+    def test_wildcards_match_literally(self):
+        self.assertEqual(self.ids('k_m'), [6])
+        self.assertEqual(self.ids('n_t'), [])
+        self.assertEqual(self.ids('0%'), [6])
+        self.assertEqual(self.ids('t%'), [])
+        self.assertEqual(self.ids('_'), [6])
+
+    def test_results_are_newest_first(self):
+        self.assertEqual([ref['id'] for ref in search_papers('network')], [4, 2])
+
+    def test_inserted_reference_is_found(self):
+        search_papers('network')
+        self.edit_library("INSERT INTO refs (id, title, year) VALUES (7, 'Network slimming', '2022');")
+        self.assertEqual(self.ids('network'), [2, 4, 7])
+
+    def test_renamed_reference_is_not_returned(self):
+        search_papers('network')
+        self.edit_library("UPDATE refs SET title = 'Transformers' WHERE id = 4;")
+        self.assertEqual(self.ids('network'), [2])
+
+    def test_reference_renamed_into_a_match_is_found(self):
+        search_papers('network')
+        self.edit_library("UPDATE refs SET title = 'Network X' WHERE id = 1;")
+        self.assertEqual(self.ids('network'), [1, 2, 4])
+
+    def test_title_edited_before_startup_is_found(self):
+        server.close_db_connection()
+        self.edit_library("UPDATE refs SET title = 'Network X' WHERE id = 1;")
+        self.build_indexes()
+        self.assertEqual(self.ids('network'), [1, 2, 4])
+
+
+@unittest.skipIf(server.hyperscan is None, "hyperscan is not installed")
+class TitleScanSearchTest(SearchPapersTest):
+    """The same cases, served by the in-memory hyperscan title scan instead of the FTS5 index."""
+
+    def build_indexes(self):
+        server._FTS_READY = False
+        self.assertTrue(server.build_title_scan_index())
+
+
+if __name__ == '__main__':
+    unittest.main()